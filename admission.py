@@ -0,0 +1,67 @@
+"""
+admission.py : admission control per route class (light lookups / heavy stats)
+"""
+
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.logger import logger
+
+
+# Limiteur de concurrence pour une classe de routes :
+# - max_concurrent requêtes exécutées en même temps
+# - max_queue requêtes en attente au maximum (au-delà : rejet immédiat)
+# - une requête en attente plus de queue_timeout secondes est rejetée
+class RouteClassLimiter:
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int,
+                 queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.waiting = 0
+        self._semaphore = None
+
+    def _reject(self, reason: str):
+        logger.error(f"Admission {self.name}: request rejected ({reason})")
+        raise HTTPException(status_code=503,
+                            detail=f"Server busy ({self.name} requests): {reason}",
+                            headers={"Retry-After": str(self.retry_after)})
+
+    # Dépendance FastAPI : prend une place avant d'ouvrir la session db,
+    # la libère une fois la réponse envoyée
+    async def __call__(self):
+        if self._semaphore is None:
+            # créé à la 1ère requête pour être attaché à la boucle du serveur
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._reject("queue full")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject("queue deadline exceeded")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+
+# Classe d'une route = coût de sa requête SQL, pas son chemin :
+# - légère : accès par clé primaire (ou par la table play via id), pagination
+#   sur clé primaire, écritures unitaires
+# - lourde : tout parcours de table sans index (filtres sur title, name, year,
+#   birthdate, LIKE), agrégats GROUP BY (stats, count/duration by year)
+# La somme des max_concurrent fixe la taille du pool (cf database.py)
+light_limiter = RouteClassLimiter("light", max_concurrent=8, max_queue=32,
+                                  queue_timeout=1.0, retry_after=1)
+
+heavy_limiter = RouteClassLimiter("heavy", max_concurrent=2, max_queue=4,
+                                  queue_timeout=5.0, retry_after=10)
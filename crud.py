@@ -11,6 +11,11 @@ from sqlalchemy import func
 from fastapi.logger import logger
 import models, schemas
 
+# nombre max de lignes renvoyées par les recherches (annoncé au client dans
+# l'en-tête X-Result-Cap) ; chaque requête plafonnée a un ORDER BY stable
+# (titre/nom puis id) pour que la troncature soit toujours la même
+MAX_RESULTS = 1000
+
 # CRUD for Movie objects
 
 #----------------------------------------- MOVIES ---------------------------------------------
@@ -30,20 +35,20 @@ def get_movie(db: Session, movie_id: int):
 
 # Récupération de tous les films (limite à 100)
 def get_movies(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Movie).offset(skip).limit(limit).all()
+    return db.query(models.Movie).order_by(models.Movie.id).offset(skip).limit(min(limit, MAX_RESULTS)).all()
 
 # Récupération des films avec le titre (en entier)
 def get_movies_by_title(db: Session, title: str):
-    return db.query(models.Movie).filter(models.Movie.title == title).all()
+    return db.query(models.Movie).filter(models.Movie.title == title).order_by(models.Movie.year, models.Movie.id).limit(MAX_RESULTS).all()
 
 # Récupération des films avec seulement une partie du titre
 def get_movies_by_parttitle(db: Session, title: str):
-    return db.query(models.Movie).filter(models.Movie.title.like(f'%{title}%')).all()
+    return db.query(models.Movie).filter(models.Movie.title.like(f'%{title}%')).order_by(models.Movie.title, models.Movie.id).limit(MAX_RESULTS).all()
 
 
 # Récupération des films avec l'année
 def get_movies_by_year(db: Session, year: int):
-    return db.query(models.Movie).filter(models.Movie.year == year).all()
+    return db.query(models.Movie).filter(models.Movie.year == year).order_by(models.Movie.title, models.Movie.id).limit(MAX_RESULTS).all()
 
 
 # Récupération des films avec un intervalle d'années
@@ -51,15 +56,16 @@ def get_movies_by_range_year(db: Session, year_min: Optional[int] = None, year_m
     if year_min is None and year_max is None:
         return None
     elif year_min is None:
-        return db.query(models.Movie).filter(models.Movie.year <= year_max).all()
+        return db.query(models.Movie).filter(models.Movie.year <= year_max).order_by(models.Movie.title, models.Movie.id).limit(MAX_RESULTS).all()
     elif year_max is None:
-        return db.query(models.Movie).filter(models.Movie.year >= year_min).all()
+        return db.query(models.Movie).filter(models.Movie.year >= year_min).order_by(models.Movie.title, models.Movie.id).limit(MAX_RESULTS).all()
     else:
         return db.query(models.Movie) \
                 .filter(
                     models.Movie.year >= year_min,
                     models.Movie.year <= year_max) \
-                .order_by(models.Movie.title) \
+                .order_by(models.Movie.title, models.Movie.id) \
+                .limit(MAX_RESULTS) \
                 .all()
 
 
@@ -67,7 +73,8 @@ def get_movies_by_range_year(db: Session, year_min: Optional[int] = None, year_m
 def get_movies_by_director_endname(db: Session, endname: str):
     return db.query(models.Movie).join(models.Movie.director)      \
             .filter(models.Star.name.like(f'%{endname}')) \
-            .order_by(desc(models.Movie.year))  \
+            .order_by(desc(models.Movie.year), models.Movie.id)  \
+            .limit(MAX_RESULTS) \
             .all()
 
 
@@ -146,20 +153,21 @@ def get_star(db: Session, star_id: int):
 
 # Récupérer toutes les stars (limite de 100)
 def get_stars(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Star).offset(skip).limit(limit).all()
+    return db.query(models.Star).order_by(models.Star.id).offset(skip).limit(min(limit, MAX_RESULTS)).all()
 
 # Récupérer une star avec son nom (en entier)
 def get_stars_by_name(db: Session, name: str):
-    return db.query(models.Star).filter(models.Star.name == name).order_by(models.Star.name).all()
+    return db.query(models.Star).filter(models.Star.name == name).order_by(models.Star.name, models.Star.id).limit(MAX_RESULTS).all()
 
 # Récupérer une star avec son nom (peut être partiellement écrit)
 def get_stars_by_partname(db: Session, name: str):
-    return db.query(models.Star).filter(models.Star.name.like(f'%{name}%')).all()
+    return db.query(models.Star).filter(models.Star.name.like(f'%{name}%')).order_by(models.Star.name, models.Star.id).limit(MAX_RESULTS).all()
 
 # Récupérer une star avec sa date de naissance
 def get_stars_by_birthyear(db: Session, year: int):
     return db.query(models.Star).filter(extract('year', models.Star.birthdate) == year) \
-            .order_by(models.Star.name)  \
+            .order_by(models.Star.name, models.Star.id)  \
+            .limit(MAX_RESULTS) \
             .all()
 ######### Fonction add/create : POST
 
@@ -218,14 +226,17 @@ def get_stars_by_movie_id(db: Session, movie_id: Optional[int] = None):
 # Récupérer le réalisateur avec le titre (partiel ou non) du film
 def get_star_director_movie_by_title(db: Session, title: str):
     db_movies = db.query(models.Movie).filter(models.Movie.title.like(f'%{title}%')) \
-        .join(models.Movie.director)  
+        .join(models.Movie.director)  \
+        .order_by(models.Movie.title, models.Movie.id)  \
+        .limit(MAX_RESULTS)
     return [ db_movie.director for db_movie in db_movies ]
 
 # Récupérer le nom des acteurs d'un film avec son titre (partiel ou non)
 def get_actors_by_movie_title(db: Session, title: str):
     return db.query(models.Star).join(models.Movie.actors) \
             .filter(models.Movie.title.like(f'%{title}'))   \
-            .order_by(models.Star.name) \
+            .order_by(models.Star.name, models.Star.id) \
+            .limit(MAX_RESULTS) \
             .all()
 
 
@@ -233,7 +244,8 @@ def get_actors_by_movie_title(db: Session, title: str):
 def get_movies_by_actor(db: Session, name: str):
     return db.query(models.Movie).join(models.Movie.actors) \
             .filter(models.Star.name.like(f'%{name}'))   \
-            .order_by(desc(models.Movie.year))              \
+            .order_by(desc(models.Movie.year), models.Movie.id)  \
+            .limit(MAX_RESULTS) \
             .all()
 
 # Nombre de films par réalisateur (avec nb de films supérieur à ...)
@@ -242,7 +254,8 @@ def get_stats_by_movie_director(db: Session, min_count: int):
         .join(models.Movie.director)        \
         .group_by(models.Star)  \
         .having(func.count(models.Movie.id) >= min_count) \
-        .order_by(desc("movie_count")) \
+        .order_by(desc("movie_count"), models.Star.id) \
+        .limit(MAX_RESULTS) \
         .all()
 
 # Nombre de films par acteur + année 1er film et année dernier film (avec nb de films supérieur à ...)
@@ -251,7 +264,8 @@ def get_stats_by_movie_actor(db: Session, min_count: int):
         .join(models.Movie.actors)        \
         .group_by(models.Star)  \
         .having(func.count(models.Movie.id) >= min_count) \
-        .order_by(desc("movie_count")) \
+        .order_by(desc("movie_count"), models.Star.id) \
+        .limit(MAX_RESULTS) \
         .all()
 
 ########## Fonction add : POST
@@ -0,0 +1,122 @@
+"""
+test_admission.py : RouteClassLimiter driven directly with asyncio
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+
+from admission import RouteClassLimiter
+
+
+def make_limiter(max_concurrent=1, max_queue=1, queue_timeout=0.05, retry_after=7):
+    return RouteClassLimiter("test", max_concurrent=max_concurrent, max_queue=max_queue,
+                             queue_timeout=queue_timeout, retry_after=retry_after)
+
+
+# prend une place comme le ferait FastAPI ; aclose() la libère
+async def admit(limiter):
+    gen = limiter()
+    await gen.__anext__()
+    return gen
+
+
+def assert_idle(limiter):
+    assert limiter.waiting == 0
+    assert limiter._semaphore._value == limiter.max_concurrent
+    assert not limiter._semaphore.locked()
+
+
+def assert_rejected(error, retry_after):
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": str(retry_after)}
+
+
+def test_admits_up_to_max_concurrent_then_releases():
+    async def scenario():
+        limiter = make_limiter(max_concurrent=2)
+        first = await admit(limiter)
+        second = await admit(limiter)
+        assert limiter._semaphore.locked()
+        await first.aclose()
+        await second.aclose()
+        assert_idle(limiter)
+    asyncio.run(scenario())
+
+
+def test_queue_full_is_rejected_immediately():
+    async def scenario():
+        limiter = make_limiter(max_concurrent=1, max_queue=1, queue_timeout=5.0)
+        running = await admit(limiter)
+        queued = asyncio.ensure_future(admit(limiter))
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        with pytest.raises(HTTPException) as error:
+            await admit(limiter)
+        assert_rejected(error.value, limiter.retry_after)
+        assert "queue full" in error.value.detail
+        # la requête en file obtient la place libérée
+        await running.aclose()
+        await (await queued).aclose()
+        assert_idle(limiter)
+    asyncio.run(scenario())
+
+
+def test_queue_deadline_is_rejected():
+    async def scenario():
+        limiter = make_limiter(max_concurrent=1, max_queue=4, queue_timeout=0.05)
+        running = await admit(limiter)
+        with pytest.raises(HTTPException) as error:
+            await admit(limiter)
+        assert_rejected(error.value, limiter.retry_after)
+        assert "deadline" in error.value.detail
+        assert limiter.waiting == 0
+        await running.aclose()
+        assert_idle(limiter)
+    asyncio.run(scenario())
+
+
+def test_permit_released_when_request_fails():
+    async def scenario():
+        limiter = make_limiter()
+        gen = await admit(limiter)
+        with pytest.raises(ValueError):
+            await gen.athrow(ValueError("endpoint error"))
+        assert_idle(limiter)
+    asyncio.run(scenario())
+
+
+def test_cancelled_while_queued_leaves_no_trace():
+    async def scenario():
+        limiter = make_limiter(max_concurrent=1, max_queue=1, queue_timeout=5.0)
+        running = await admit(limiter)
+        queued = asyncio.ensure_future(admit(limiter))
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert limiter.waiting == 0
+        await running.aclose()
+        assert_idle(limiter)
+    asyncio.run(scenario())
+
+
+def test_cancelled_while_running_releases_permit():
+    async def scenario():
+        limiter = make_limiter()
+
+        # FastAPI enveloppe les dépendances à yield dans un context manager
+        async def request():
+            async with asynccontextmanager(limiter)():
+                await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(request())
+        await asyncio.sleep(0)
+        assert limiter._semaphore.locked()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert_idle(limiter)
+    asyncio.run(scenario())